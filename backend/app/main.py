@@ -1,115 +1,288 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import json
-from typing import List, Optional
-from dataclasses import dataclass, asdict
-import urllib.parse
+from __future__ import annotations
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import logging
+import os
+import re
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _dumps = lambda o: json.dumps(o).encode()
+    _loads = json.loads
+
+log = logging.getLogger('jsrob')
+log.addHandler(logging.NullHandler())
 
-@dataclass
 class Item:
-    id: int
-    name: str
-    description: Optional[str] = None
-    completed: bool = False
+    # Plain class rather than @dataclass(slots=True), which needs Python 3.10
+    __slots__ = ('id', 'name', 'description', 'completed')
+
+    def __init__(self, id: int, name: str, description: str | None = None,
+                 completed: bool = False):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.completed = completed
+
+    def __repr__(self):
+        return (f"Item(id={self.id!r}, name={self.name!r}, "
+                f"description={self.description!r}, completed={self.completed!r})")
+
+    def to_dict(self):
+        # Built directly; dataclasses.asdict would deep-copy every field
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'completed': self.completed
+        }
+
+# In-memory storage, keyed by item id (dicts preserve insertion order)
+items: dict[int, Item] = {}
+# Serialized GET /items response, rebuilt lazily after any mutation
+_items_cache: bytes | None = None
+# Guards items and _items_cache now that requests are served concurrently
+_items_lock = threading.Lock()
+
+# Error bodies are fixed, so encode them once
+_ERR_NOT_FOUND = b'{"error":"Not found"}'
+_ERR_ITEM_NOT_FOUND = b'{"error":"Item not found"}'
+_ERR_INVALID = b'{"error":"Invalid request"}'
+_ERR_TOO_LARGE = b'{"error":"Request body too large"}'
 
-# In-memory storage
-items: List[Item] = []
+# Upper bound on accepted request bodies; items are tiny JSON objects
+MAX_BODY = 1 << 16
+
+class _BodyTooLarge(Exception):
+    pass
+
+# Largest id that still encodes as a signed 64-bit JSON integer
+MAX_ID = 2**63 - 1
+
+def _parse_id(value):
+    # Accept non-negative ints or digit strings, i.e. ids /items/<id> can
+    # address; int() alone would truncate floats and accept bools
+    if isinstance(value, int) and not isinstance(value, bool):
+        item_id = value
+    elif isinstance(value, str) and value.isascii() and value.isdigit():
+        item_id = int(value)
+    else:
+        item_id = -1
+    # orjson can only encode 64-bit integers
+    if 0 <= item_id <= MAX_ID:
+        return item_id
+    raise ValueError(f"Invalid item id: {value!r}")
+
+# Matches /items/<id>, see _ID_ROUTES
+_ITEM_RE = re.compile(r'^/items/(\d+)$')
+
+# Header block shared by every response, written together with the status
+# line and body instead of one send_header() write per header
+_JSON_HEADERS = (
+    b'Content-type: application/json\r\n'
+    b'Access-Control-Allow-Origin: *\r\n'
+    b'Access-Control-Allow-Methods: *\r\n'
+    b'Access-Control-Allow-Headers: *\r\n'
+)
 
 class RequestHandler(BaseHTTPRequestHandler):
-    def _set_headers(self, status_code=200):
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', '*')
-        self.send_header('Access-Control-Allow-Headers', '*')
-        self.end_headers()
+    # Keep connections alive between requests; every response therefore
+    # has to carry an explicit Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Per-request access lines go through the logger at DEBUG instead
+        # of an unconditional write to stderr
+        log.debug("%s - - [%s] " + format, self.address_string(),
+                  self.log_date_time_string(), *args)
+
+    def _send_json(self, status_code, body):
+        # Status line, headers and body go out in a single write
+        self.log_request(status_code)
+        head = b'%s %d %s\r\n' % (
+            self.protocol_version.encode(), status_code,
+            self.responses[status_code][0].encode()
+        ) + _JSON_HEADERS + b'Content-Length: %d\r\n' % len(body)
+        if self.close_connection:
+            head += b'Connection: close\r\n'
+        self.wfile.write(head + b'\r\n' + body)
+
+    def _body_length(self):
+        # Returns the body size, or None when the body can't be framed
+        # (chunked, malformed or negative Content-Length). Those leave the
+        # stream unsafe for another request, so the connection is closed.
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.close_connection = True
+            return None
+        try:
+            content_length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.close_connection = True
+            return None
+        return content_length
+
+    def _discard_body(self):
+        # Routes that ignore the body must still consume it, or its bytes
+        # would be parsed as the next request on this keep-alive connection
+        if self.close_connection:
+            return
+        content_length = self._body_length()
+        if content_length is None:
+            return
+        if content_length > MAX_BODY:
+            self.close_connection = True
+        elif content_length:
+            self.rfile.read(content_length)
+
+    def _read_json(self):
+        self._body_read = True
+        content_length = self._body_length()
+        if content_length is None:
+            raise ValueError("Unsupported request body framing")
+        if content_length > MAX_BODY:
+            # Left unread, so the stream can't be reused
+            self.close_connection = True
+            raise _BodyTooLarge()
+        buf = bytearray(content_length)
+        view = memoryview(buf)
+        got = 0
+        while got < content_length:
+            n = self.rfile.readinto(view[got:])
+            if not n:
+                self.close_connection = True
+                raise ValueError("Request body truncated")
+            got += n
+        data = _loads(buf)  # orjson and json both accept a bytearray
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data
 
     def do_OPTIONS(self):
-        self._set_headers()
-
-    def do_GET(self):
-        if self.path == '/items':
-            self._set_headers()
-            response = json.dumps([asdict(item) for item in items])
-            self.wfile.write(response.encode())
-        else:
-            self._set_headers(404)
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
-
-    def do_POST(self):
-        if self.path == '/items':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            item_data = json.loads(post_data.decode())
-            
+        self._discard_body()
+        self._send_json(200, b'')
+
+    def _dispatch(self):
+        self._body_read = False
+        try:
+            handler = _STATIC_ROUTES.get((self.command, self.path))
+            if handler is not None:
+                return handler(self)
+            handler = _ID_ROUTES.get(self.command)
+            if handler is not None:
+                m = _ITEM_RE.match(self.path)
+                if m:
+                    return handler(self, int(m.group(1)))
+            self._send_json(404, _ERR_NOT_FOUND)
+        finally:
+            if not self._body_read:
+                self._discard_body()
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def _list_items(self):
+        global _items_cache
+        response = _items_cache
+        if response is None:
+            with _items_lock:
+                if _items_cache is None:
+                    _items_cache = _dumps([item.to_dict() for item in items.values()])
+                response = _items_cache
+        self._send_json(200, response)
+
+    def _create_item(self):
+        global _items_cache
+        try:
+            item_data = self._read_json()
             new_item = Item(
-                id=item_data['id'],
+                id=_parse_id(item_data['id']),
                 name=item_data['name'],
                 description=item_data.get('description'),
                 completed=item_data.get('completed', False)
             )
-            items.append(new_item)
-            
-            self._set_headers()
-            self.wfile.write(json.dumps(asdict(new_item)).encode())
-        else:
-            self._set_headers(404)
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
-
-    def do_PUT(self):
-        if self.path.startswith('/items/'):
-            try:
-                item_id = int(self.path.split('/')[-1])
-                content_length = int(self.headers['Content-Length'])
-                put_data = self.rfile.read(content_length)
-                item_data = json.loads(put_data.decode())
-
-                for i, item in enumerate(items):
-                    if item.id == item_id:
-                        updated_item = Item(
-                            id=item_id,
-                            name=item_data.get('name', item.name),
-                            description=item_data.get('description', item.description),
-                            completed=item_data.get('completed', item.completed)
-                        )
-                        items[i] = updated_item
-                        self._set_headers()
-                        self.wfile.write(json.dumps(asdict(updated_item)).encode())
-                        return
-
-                self._set_headers(404)
-                self.wfile.write(json.dumps({"error": "Item not found"}).encode())
-            except:
-                self._set_headers(400)
-                self.wfile.write(json.dumps({"error": "Invalid request"}).encode())
-        else:
-            self._set_headers(404)
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
-
-    def do_DELETE(self):
-        if self.path.startswith('/items/'):
-            try:
-                item_id = int(self.path.split('/')[-1])
-                for i, item in enumerate(items):
-                    if item.id == item_id:
-                        deleted_item = items.pop(i)
-                        self._set_headers()
-                        self.wfile.write(json.dumps(asdict(deleted_item)).encode())
-                        return
-
-                self._set_headers(404)
-                self.wfile.write(json.dumps({"error": "Item not found"}).encode())
-            except:
-                self._set_headers(400)
-                self.wfile.write(json.dumps({"error": "Invalid request"}).encode())
-        else:
-            self._set_headers(404)
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
-
-def run(server_class=HTTPServer, handler_class=RequestHandler, port=8000):
+            # Encode before storing, so an unencodable item can't end up in
+            # items and break every later GET /items
+            response = _dumps(new_item.to_dict())
+        except _BodyTooLarge:
+            return self._send_json(413, _ERR_TOO_LARGE)
+        except (TypeError, ValueError, KeyError):
+            return self._send_json(400, _ERR_INVALID)
+
+        with _items_lock:
+            items[new_item.id] = new_item
+            _items_cache = None
+        self._send_json(200, response)
+
+    def _update_item(self, item_id):
+        global _items_cache
+        try:
+            item_data = self._read_json()
+        except _BodyTooLarge:
+            return self._send_json(413, _ERR_TOO_LARGE)
+        except (TypeError, ValueError):
+            return self._send_json(400, _ERR_INVALID)
+
+        with _items_lock:
+            item = items.get(item_id)
+            if item is not None:
+                updated_item = Item(
+                    id=item_id,
+                    name=item_data.get('name', item.name),
+                    description=item_data.get('description', item.description),
+                    completed=item_data.get('completed', item.completed)
+                )
+                # Encode before storing, as in _create_item
+                try:
+                    response = _dumps(updated_item.to_dict())
+                except TypeError:
+                    response = None
+                else:
+                    items[item_id] = updated_item
+                    _items_cache = None
+
+        if item is None:
+            return self._send_json(404, _ERR_ITEM_NOT_FOUND)
+        if response is None:
+            return self._send_json(400, _ERR_INVALID)
+        self._send_json(200, response)
+
+    def _delete_item(self, item_id):
+        global _items_cache
+        with _items_lock:
+            deleted_item = items.pop(item_id, None)
+            if deleted_item is not None:
+                _items_cache = None
+
+        if deleted_item is None:
+            return self._send_json(404, _ERR_ITEM_NOT_FOUND)
+        self._send_json(200, _dumps(deleted_item.to_dict()))
+
+# (method, path) -> handler for fixed paths
+_STATIC_ROUTES = {
+    ('GET', '/items'): RequestHandler._list_items,
+    ('POST', '/items'): RequestHandler._create_item,
+}
+# method -> handler for /items/<id>
+_ID_ROUTES = {
+    'PUT': RequestHandler._update_item,
+    'DELETE': RequestHandler._delete_item,
+}
+
+def run(server_class=ThreadingHTTPServer, handler_class=RequestHandler, port=8000):
     server_address = ('', port)
     httpd = server_class(server_address, handler_class)
-    print(f"Starting server on port {port}...")
+    log.info("Starting server on port %d...", port)
     httpd.serve_forever()
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG if os.environ.get('JSROB_DEBUG') == '1' else logging.INFO,
+        format='%(message)s'
+    )
     run()
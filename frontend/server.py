@@ -1,83 +1,249 @@
 import os
+import errno
+import functools
+import logging
 import http.server
+import mimetypes
+import multiprocessing
+import signal
+import socket
 import socketserver
-import json
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    import json
+    _dumps = lambda o: json.dumps(o).encode()
+
+# Directory containing this script; files are served relative to it
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_MODELS_DIR = os.path.join(_SCRIPT_DIR, 'public', 'models')
+
+# Startup messages are logged at INFO, per-request/per-file chatter at DEBUG
+# (enabled with JSROB_DEBUG=1)
+log = logging.getLogger('jsrob')
+log.addHandler(logging.NullHandler())
+
+# Headers for /api/models responses, written in one go with the status line
+# and body
+_API_HEADERS = (
+    b'Content-type: application/json\r\n'
+    b'Access-Control-Allow-Origin: *\r\n'
+    b'Access-Control-Allow-Methods: GET, OPTIONS\r\n'
+    b'Access-Control-Allow-Headers: Content-Type\r\n'
+    b'Cache-Control: no-store, no-cache, must-revalidate\r\n'
+    b'Pragma: no-cache\r\n'
+)
+
+# Largest request body drained to keep a connection alive; GET/HEAD bodies
+# are never used, so anything bigger just closes the connection
+MAX_BODY = 1 << 16
+
+# Known file extension (lowercased) -> Content-Type, so mimetypes is
+# consulted once per extension
+_content_types = {}
+
+# Extensions the viewer serves, cached even when mimetypes doesn't know them
+_SERVED_EXTENSIONS = frozenset(('.urdf', '.stl', '.dae', '.html', '.js'))
+
+# ({directory: stamp}, {extension: models}, {extension: JSON-encoded models})
+_models_cache = None
+
+def _dir_stamp(path):
+    # ctime also moves on chmod/chown, so a directory skipped as unreadable
+    # is rescanned once its permissions are fixed
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_ctime_ns)
+
+def _dirs_unchanged(dir_mtimes):
+    # The scan recurses to any depth, so every directory it visited is
+    # checked; a new subdirectory shows up as a change in its parent
+    try:
+        return all(_dir_stamp(path) == stamp
+                   for path, stamp in dir_mtimes.items())
+    except OSError:
+        return False
+
+def _cached_models():
+    global _models_cache
+    hit = _models_cache
+    if hit is not None and hit[0] and _dirs_unchanged(hit[0]):
+        return hit
+    dir_mtimes = {}
+    _models_cache = (dir_mtimes, scan_all_models(dir_mtimes), {})
+    return _models_cache
 
 def get_available_models(file_type='urdf'):
-    models = []
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    models_dir = os.path.join(base_dir, 'public', 'models')
+    return _cached_models()[1].get(file_type.lower(), [])
+
+def get_available_models_json(file_type='urdf'):
+    file_type = file_type.lower()
+    _, models, encoded = _cached_models()
+    body = encoded.get(file_type)
+    if body is None:
+        body = encoded[file_type] = _dumps(models.get(file_type, []))
+    return body
+
+def scan_all_models(dir_mtimes=None):
+    """Walk public/models once and group the files found by extension.
+
+    If dir_mtimes is given, it is filled with the mtime/ctime stamp of every
+    directory visited, each taken before that directory is listed.
+    Unreadable subdirectories are logged and left out; only a failure on
+    public/models itself fails the whole scan.
+    """
+    models = {}
+    if dir_mtimes is None:
+        dir_mtimes = {}
     
-    print(f"Searching for {file_type} files in: {models_dir}")
+    log.debug("Searching for model files in: %s", _MODELS_DIR)
     
     # Create models directory if it doesn't exist
-    if not os.path.exists(models_dir):
-        os.makedirs(models_dir)
-        print(f"Created {models_dir} directory")
+    if not os.path.exists(_MODELS_DIR):
+        os.makedirs(_MODELS_DIR)
+        log.info("Created %s directory", _MODELS_DIR)
     
     try:
-        for root, dirs, files in os.walk(models_dir):
-            print(f"Scanning directory: {root}")
-            print(f"Found files: {files}")
-            for filename in files:
-                if filename.lower().endswith(f'.{file_type.lower()}'):
-                    # Get relative path from models directory
-                    rel_path = os.path.relpath(os.path.join(root, filename), models_dir)
-                    print(f"Found {file_type} file: {rel_path}")
-                    # For URDF files, we want to keep them in the root models directory
-                    if file_type.lower() == 'urdf':
-                        models.append({
-                            'name': os.path.splitext(filename)[0],  # Remove .urdf extension
-                            'urdf': filename  # Just use the filename for URDF files
-                        })
-                    else:
-                        models.append({
-                            'name': filename,
-                            'urdf': rel_path  # Store the relative path for mesh files
-                        })
-        print(f"Total {file_type} files found: {len(models)}")
+        _scan_dir(_MODELS_DIR, '', models, dir_mtimes)
         return models
     except Exception as e:
-        print(f"Error reading models directory: {e}")
-        return []
+        log.error("Error reading models directory: %s", e)
+        dir_mtimes.clear()  # Don't cache a failed scan
+        return {}
+
+def _scan_dir(path, rel_root, models, dir_mtimes):
+    log.debug("Scanning directory: %s", path)
+    try:
+        dir_mtimes[path] = _dir_stamp(path)
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError as e:
+        if not rel_root:
+            raise
+        # Like os.walk, skip subdirectories that can't be read (or vanished)
+        log.warning("Skipping unreadable directory %s: %s", path, e)
+        return
+    subdirs = []
+    for entry in entries:
+        filename = entry.name
+        if entry.is_dir():
+            # Like os.walk, don't follow symlinked directories
+            if not entry.is_symlink():
+                subdirs.append(entry)
+            continue
+        file_type = os.path.splitext(filename)[1][1:].lower()
+        if not file_type:
+            continue
+        if file_type == 'urdf':
+            # URDF files are only served from the root models directory
+            if rel_root:
+                continue
+            model = {
+                'name': os.path.splitext(filename)[0],  # Remove .urdf extension
+                'urdf': filename  # Just use the filename for URDF files
+            }
+        else:
+            # Get relative path from models directory
+            model = {
+                'name': filename,
+                'urdf': os.path.join(rel_root, filename)  # Store the relative path for mesh files
+            }
+        log.debug("Found %s file: %s", file_type, model['urdf'])
+        models.setdefault(file_type, []).append(model)
+    for entry in subdirs:
+        _scan_dir(entry.path, os.path.join(rel_root, entry.name), models, dir_mtimes)
+
+class ReusePortTCPServer(socketserver.ThreadingTCPServer):
+    # Idle keep-alive connections must not hold up shutdown
+    daemon_threads = True
+    allow_reuse_address = True
+    # The stdlib default of 5 overflows as soon as a viewer fetches its meshes
+    request_queue_size = 128
+    # Lets several worker processes share the port; the kernel spreads
+    # incoming connections across them. Single-process servers turn it off
+    # so a second instance on the same port is reported as a conflict.
+    reuse_port = True
+
+    def server_bind(self):
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
 
 class RequestHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        # Change to the directory containing this script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        os.chdir(script_dir)
-        super().__init__(*args, **kwargs)
+    # Keep connections alive so the viewer can fetch all meshes over one socket
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Per-request access lines go through the logger at DEBUG instead
+        # of an unconditional write to stderr
+        log.debug("%s - - [%s] " + format, self.address_string(),
+                  self.log_date_time_string(), *args)
+
+    def guess_type(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        ctype = _content_types.get(ext)
+        if ctype is None:
+            ctype = super().guess_type(path)
+            # send_head asks before checking the file exists, so only remember
+            # known extensions; bogus requests must not grow the cache
+            if (ext in _SERVED_EXTENSIONS or ext in self.extensions_map
+                    or ext in mimetypes.types_map):
+                _content_types[ext] = ctype
+        return ctype
+
+    def copyfile(self, source, outputfile):
+        if outputfile is not self.wfile:
+            return super().copyfile(source, outputfile)
+        # Let the kernel copy mesh/URDF files straight to the socket;
+        # socket.sendfile falls back to plain send() where unsupported
+        outputfile.flush()
+        self.connection.sendfile(source)
+
+    def _discard_body(self):
+        # Unread body bytes would be parsed as the next request on this
+        # keep-alive connection
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.close_connection = True
+            return
+        try:
+            content_length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            self.close_connection = True
+            return
+        if content_length < 0 or content_length > MAX_BODY:
+            self.close_connection = True
+        elif content_length:
+            self.rfile.read(content_length)
+
+    def do_HEAD(self):
+        self._discard_body()
+        return super().do_HEAD()
 
     def do_GET(self):
+        self._discard_body()
         if self.path.startswith('/api/models'):
-            print(f"\nHandling API request: {self.path}")
-            # Add CORS headers
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
-            self.send_header('Pragma', 'no-cache')
-            self.end_headers()
-            
+            log.debug("Handling API request: %s", self.path)
             # Check if we're looking for STL files
             if 'stl=true' in self.path:
-                print("Requesting STL files")
-                models = get_available_models('stl')
+                log.debug("Requesting STL files")
+                response = get_available_models_json('stl')
             else:
-                print("Requesting URDF files")
-                models = get_available_models('urdf')
-                print(f"Found URDF models: {json.dumps(models, indent=2)}")
+                log.debug("Requesting URDF files")
+                response = get_available_models_json('urdf')
             
-            response = json.dumps(models)
-            print(f"Sending response: {response}")
-            self.wfile.write(response.encode())
+            # Add CORS headers
+            self.log_request(200)
+            self.wfile.write(
+                self.protocol_version.encode() + b' 200 OK\r\n' + _API_HEADERS +
+                b'Content-Length: %d\r\n\r\n' % len(response) + response
+            )
             return
         elif self.path == '/':
             # Redirect root to URDF viewer
             self.send_response(302)
             self.send_header('Location', '/public/urdf_viewer.html')
+            self.send_header('Content-Length', '0')
             self.end_headers()
             return
         else:
@@ -86,68 +252,130 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 # Remove query parameters for file serving
                 clean_path = self.path.split('?')[0]
                 self.path = clean_path
-                print(f"Serving file: {self.path}")
+                log.debug("Serving file: %s", self.path)
                 
                 # Special handling for mesh files
                 if '/meshes/' in clean_path:
                     # Keep the meshes path as is, don't adjust it
-                    print(f"Serving mesh file from: {self.path}")
+                    log.debug("Serving mesh file from: %s", self.path)
                 
                 return super().do_GET()
             except Exception as e:
-                print(f"Error serving file: {self.path}")
-                print(f"Error details: {str(e)}")
+                log.error("Error serving file: %s", self.path)
+                log.error("Error details: %s", e)
                 self.send_error(404, str(e))
 
-def run_server(port=8000):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+def run_server(port=8000, workers=1):
     # Create meshes directory if it doesn't exist
-    meshes_dir = os.path.join(base_dir, 'public', 'models', 'meshes')
+    meshes_dir = os.path.join(_MODELS_DIR, 'meshes')
     if not os.path.exists(meshes_dir):
         os.makedirs(meshes_dir)
-        print(f"Created {meshes_dir} directory")
+        log.info("Created %s directory", meshes_dir)
+
+    # One walk over public/models finds URDF and mesh files alike, and
+    # primes the cache used by /api/models
+    log.info("Scanning for model files...")
+    models = _cached_models()[1]
 
     # List available URDF files
-    print("\nScanning for URDF files...")
-    urdf_models = get_available_models('urdf')
+    urdf_models = models.get('urdf', [])
     
     if urdf_models:
-        print(f"\nFound {len(urdf_models)} URDF files in public/models:")
+        log.info("Found %d URDF files in public/models:", len(urdf_models))
         for model in urdf_models:
-            print(f"- {model['name']}")
+            log.info("- %s", model['name'])
     else:
-        print("\nNo URDF files found. Place .urdf files in public/models/")
+        log.info("No URDF files found. Place .urdf files in public/models/")
 
     # List available mesh files
-    print("\nScanning for mesh files...")
-    stl_models = get_available_models('stl')
-    dae_models = get_available_models('dae')
+    stl_models = models.get('stl', [])
+    dae_models = models.get('dae', [])
     
     if stl_models:
-        print(f"\nFound {len(stl_models)} STL files:")
+        log.info("Found %d STL files:", len(stl_models))
         for model in stl_models:
-            print(f"- {model['urdf']}")
+            log.info("- %s", model['urdf'])
     
     if dae_models:
-        print(f"\nFound {len(dae_models)} DAE files:")
+        log.info("Found %d DAE files:", len(dae_models))
         for model in dae_models:
-            print(f"- {model['urdf']}")
+            log.info("- %s", model['urdf'])
     
     if not (stl_models or dae_models):
-        print("\nNo mesh files found. Place .stl or .dae files in public/models/meshes/")
+        log.info("No mesh files found. Place .stl or .dae files in public/models/meshes/")
     
-    print(f"\nStarting server at http://localhost:{port}")
-    print(f"URDF Viewer: http://localhost:{port}/public/urdf_viewer.html")
-    print(f"STL Viewer: http://localhost:{port}/public/stl_viewer.html")
+    if workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        log.warning("SO_REUSEPORT is not supported here; running a single worker")
+        workers = 1
+
+    # Bind the real server; only fall back to a kernel-assigned port if the
+    # requested one is taken, so there is no probe-then-bind race
+    try:
+        httpd = _bind_server(port, reuse_port=workers > 1)
+    except OSError as e:
+        if e.errno != errno.EADDRINUSE:
+            raise
+        httpd = _bind_server(0, reuse_port=workers > 1)
+        log.warning("Port %d is in use, using port %d instead",
+                    port, httpd.server_address[1])
+    port = httpd.server_address[1]
+
+    log.info("Starting server at http://localhost:%d", port)
+    log.info("URDF Viewer: http://localhost:%d/public/urdf_viewer.html", port)
+    log.info("STL Viewer: http://localhost:%d/public/stl_viewer.html", port)
     
-    with socketserver.TCPServer(("", port), RequestHandler) as httpd:
+    # Every worker binds the same port; the parent process serves as well
+    procs = [multiprocessing.Process(target=_serve_worker, args=(port,), daemon=True)
+             for _ in range(workers - 1)]
+    for proc in procs:
+        proc.start()
+    if procs:
+        # Unwind the serve loop on SIGTERM too, so the workers are stopped
+        # below instead of being orphaned (daemon=True only covers a normal
+        # exit). signal.signal needs the main thread, which a multi-process
+        # launch uses anyway.
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        _serve(httpd)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
+
+def _bind_server(port, reuse_port):
+    # Serve files relative to this script rather than chdir-ing per request
+    handler = functools.partial(RequestHandler, directory=_SCRIPT_DIR)
+    httpd = ReusePortTCPServer(("", port), handler, bind_and_activate=False)
+    httpd.reuse_port = reuse_port
+    try:
+        httpd.server_bind()
+        httpd.server_activate()
+    except BaseException:
+        httpd.server_close()
+        raise
+    return httpd
+
+def _serve_worker(port):
+    _serve(_bind_server(port, reuse_port=True))
+
+def _serve(httpd):
+    with httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
-            print("\nShutting down server...")
+            log.info("Shutting down server...")
             httpd.shutdown()
 
 if __name__ == "__main__":
     import sys
+    logging.basicConfig(
+        level=logging.DEBUG if os.environ.get('JSROB_DEBUG') == '1' else logging.INFO,
+        format='%(message)s'
+    )
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
-    run_server(port) 
\ No newline at end of file
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    run_server(port, workers) 
\ No newline at end of file